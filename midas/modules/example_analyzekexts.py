@@ -12,7 +12,7 @@ from sys import argv
 from lib.ty_orm import TyORM
 from lib.config import Config
 from lib.data_science import DataScience
-from lib.helpers.filesystem import hash_kext
+from lib.helpers.filesystem import hash_kexts
 from lib.helpers.system import get_kextstat, get_kextfind
 from lib.helpers.utilities import error_running_file
 from lib.tables.example import tables
@@ -32,9 +32,13 @@ class AnalyzeKexts(object):
         """
         kernel_extensions = get_kextstat()
         extension_paths = get_kextfind()
+        hashes = hash_kexts(
+            extension_paths,
+            [i['Name'] for i in kernel_extensions.itervalues() if 'Name' in i]
+        )
         for i in kernel_extensions.itervalues():
             try:
-                file_hash = hash_kext(extension_paths, i['Name'])
+                file_hash = hashes[i['Name']]
                 if not file_hash:
                     file_hash = "KEY DNE"
                 self.data.append({
@@ -3,35 +3,173 @@
 This is a set of helper functions for filesystem utilities
 """
 
-from os import listdir, walk, stat
-from os.path import isfile, isdir, join, getmtime, islink
-from itertools import product
+from os import listdir, stat, lstat
+from os.path import isfile, join, basename
 from hashlib import sha1
-from stat import ST_MODE
-from sys import getsizeof
-from base64 import b64decode
-from re import match
-from operator import itemgetter
+from hashlib import new as new_hash
+from functools import partial
+from stat import ST_MODE, S_ISDIR, S_ISREG, S_ISLNK
+from itertools import chain, islice
+from re import compile as recompile
+from re import MULTILINE
+from fnmatch import fnmatchcase
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from mmap import mmap, ACCESS_READ
+
+from system import shell_out, shell_out_iter, get_kextfind
+from utilities import memoize
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# file hashes are only used to identify files, so where the interpreter
+# supports it the hash is flagged as not being used for security and is
+# served by OpenSSL even in FIPS mode
+try:
+    new_hash('sha1', usedforsecurity=False)
+except TypeError:
+    _sha1 = sha1
+else:
+    _sha1 = partial(new_hash, 'sha1', usedforsecurity=False)
+
+MIN_RSA_KEY_LENGTH = 372
+
+STREAM_BATCH_SIZE = 256
+
+# an authorized_keys line holding a DSA key or an RSA key whose base64 encoding
+# is shorter than MIN_RSA_KEY_LENGTH
+WEAK_KEY_RE = recompile(
+    br"^[ \t]*(?:ssh-dss[ \t]+\S|ssh-rsa[ \t]+\S{1,%d}(?!\S))" % (
+        MIN_RSA_KEY_LENGTH - 1,
+    ),
+    MULTILINE
+)
+
+SSH_HOME_RE = recompile(r"^/Users/[a-zA-Z0-9]*/\.ssh")
+
+PRIVATE_KEY_RE = recompile(br"^[-]*BEGIN.*PRIVATE KEY[-]*$")
+
+# directories, relative to a home directory, whose files are collected by
+# collect_home_artifacts
+HOME_ARTIFACT_DIRS = {
+    "launch_agents": "Library/LaunchAgents",
+    "prefs_byhost": "Library/Preferences/ByHost",
+}
+
+# files, relative to a home directory, that collect_home_artifacts looks for
+HOME_ARTIFACT_FILES = {
+    "recentitems": ["Library/Preferences/com.apple.recentitems.plist"],
+    "authorized_keys": [".ssh/authorized_keys", ".ssh2/authorized_keys"],
+    "ssh_keys": [".ssh/id_rsa"],
+}
+
+
+class _DirEntry(object):
+    """
+    A minimal stand-in for os.DirEntry, used when neither os.scandir nor the
+    scandir backport is available. Like os.DirEntry, it stats the entry at
+    most once (plus once more to follow a symlink) and caches the results
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = join(directory, name)
+        self._stat = None
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        """
+        Returns the stat of the entry
+        """
+        if follow_symlinks:
+            if self._stat is None:
+                if self.is_symlink():
+                    self._stat = stat(self.path)
+                else:
+                    self._stat = self.stat(follow_symlinks=False)
+            return self._stat
+        if self._lstat is None:
+            self._lstat = lstat(self.path)
+        return self._lstat
+
+    def is_dir(self, follow_symlinks=True):
+        """
+        Returns True if the entry is a directory
+        """
+        try:
+            return S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
 
-from system import shell_out
+    def is_file(self, follow_symlinks=True):
+        """
+        Returns True if the entry is a regular file
+        """
+        try:
+            return S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
 
+    def is_symlink(self):
+        """
+        Returns True if the entry is a symbolic link
+        """
+        try:
+            return S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+        except OSError:
+            return False
 
-def list_all_in_dir(directory):
+
+def _scandir(directory):
     """
-    Returns an array of all files and dirs that are present in a directory.
+    Returns an iterable of DirEntry objects for a directory. The entries
+    carry the file type read along with the directory listing, so checking
+    whether an entry is a file or a directory usually doesn't need a stat
 
     Arguments:
-      - dir: the directory to be searched
+      - directory: the directory to be listed
+    """
+    if scandir is not None:
+        return scandir(directory)
+    return [_DirEntry(directory, name) for name in listdir(directory)]
+
 
+def _scan(directory, predicate):
     """
-    try:
-        if not directory.endswith('/'):
-            directory = "%s/" % (directory, )
-    except AttributeError:
+    Returns an array of the paths of the entries in a directory for which
+    predicate(entry) is True. Returns an empty array if the directory can't
+    be read
+
+    Arguments:
+      - directory: the directory to be searched
+      - predicate: a function that takes a DirEntry and returns a boolean
+    """
+    if not directory:
         return []
+    try:
+        return [entry.path for entry in _scandir(directory)
+                if predicate(entry)]
     except OSError:
         return []
-    return [directory + f for f in listdir(directory)]
+
+
+def list_all_in_dir(directory):
+    """
+    Returns an array of all files and dirs that are present in a directory.
+
+    Arguments:
+      - dir: the directory to be searched
+
+    """
+    return _scan(directory, lambda entry: True)
 
 
 def list_files_in_dir(directory):
@@ -43,15 +181,7 @@ def list_files_in_dir(directory):
       - dir: the directory to be searched
 
     """
-    try:
-        if not directory.endswith('/'):
-            directory = "%s/" % (directory, )
-    except AttributeError:
-        return []
-    except OSError:
-        return []
-    return [directory + f for f in listdir(directory)\
-            if isfile(join(directory, f))]
+    return _scan(directory, lambda entry: entry.is_file())
 
 
 def list_dirs_in_dir(directory):
@@ -62,64 +192,68 @@ def list_dirs_in_dir(directory):
       - dir: the directory to be searched
 
     """
-    try:
-        if not directory.endswith('/'):
-            directory = "%s/" % (directory, )
-    except AttributeError:
-        return []
-    except OSError:
-        return []
-    return [directory + f for f in listdir(directory)\
-            if isdir(join(directory, f))]
+    return _scan(directory, lambda entry: entry.is_dir())
 
 
 def get_most_recently_updated_file(directory):
     """
     Returns the path of the most recently updated file in a directory
     """
+    if not directory:
+        return None
     try:
-        files = list_files_in_dir(directory)
+        files = [entry for entry in _scandir(directory)
+                 if not entry.is_symlink() and entry.is_file()]
+        if files:
+            return max(files, key=lambda entry: entry.stat().st_mtime).path
     except OSError:
-        return None
-    if files:
-        try:
-            files = {}
-            for i in files:
-                if not islink(i):
-                    files[i] = getmtime(i)
-            if files:
-                try:
-                    return sorted(files.iteritems(), key=itemgetter(1))[-1][0]
-                except KeyError:
-                    return None
-        except OSError:
-            return None
-    else:
-        return None
+        pass
+    return None
 
 
 def hash_file(filename):
     """
-    Return the SHA1 hash of the supplied file
+    Return the SHA1 hash of the supplied file. The file is memory mapped, so
+    it's contents are hashed straight out of the page cache instead of being
+    read into a string first. The hash identifies the file's contents and
+    isn't meant to be used for anything security sensitive
 
     Arguments:
       - filename: the file to be hashed
     """
-    return sha1(file(filename, 'r').read()).hexdigest()
+    digest = _sha1()
+    with open(filename, 'rb') as fname:
+        try:
+            contents = mmap(fname.fileno(), 0, access=ACCESS_READ)
+        except (ValueError, EnvironmentError):
+            # empty files and special files can't be mapped
+            for chunk in iter(lambda: fname.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        else:
+            try:
+                digest.update(contents)
+            finally:
+                contents.close()
+    return digest.hexdigest()
 
 
+@memoize
 def get_executables():
     """
-    Find all executable files on the system with mdfind
+    Find all executable files on the system with mdfind. The result is
+    cached for the lifetime of the process, so it's returned as an immutable
+    tuple
     """
-    return shell_out("mdfind kMDItemContentType==public.unix-executable")
+    return tuple(shell_out([
+        "mdfind",
+        "kMDItemContentType==public.unix-executable",
+    ]))
 
 
 def get_documents():
     """
-    Find all document files on the system with mdfind
+    Find all document files on the system with a single mdfind query
     """
-    files = []
     file_extensions = [
         "docx", "doc",
         "xlsx", "xls",
@@ -129,68 +263,223 @@ def get_documents():
         "pages",
         "numbers"
     ]
-    for ext in file_extensions:
-        arg = "kMDItemDisplayName == *.%s" % (ext, )
-        files += shell_out("mdfind %s" % (arg, ))
-    return filter(None, files)
+    query = " || ".join(
+        "kMDItemDisplayName == '*.%s'" % (ext, ) for ext in file_extensions
+    )
+    return [i for i in shell_out_iter(["mdfind", query]) if i]
 
 
-def hash_kext(kextfind, kext):
+def _parallel_map(func, iterable):
     """
-    Looks in /System/Library/Extensions/ for a supplied kext and returns it's
-    hash if it exists, None if it doesn't
+    Returns map(func, iterable), computed on a pool of threads so that the
+    filesystem reads of one item overlap with the work on the others
+
+    Arguments:
+      - func: the function to apply to every item
+      - iterable: the items to process
     """
-    kext = kext.split(".")[-1]
-    found = None
-    for i in kextfind:
-        if i.split('/')[-1].strip('.kext') == kext:
-            path = join(i, "Contents", "MacOS", kext)
-            if isfile(path):
-                found = path
+    items = list(iterable)
+    if not items:
+        return []
+    pool = ThreadPool(min(32, cpu_count() * 4, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _parallel_map_stream(func, iterable):
+    """
+    Yields func(item) for every item of iterable, in order, computed on a
+    pool of threads. The iterable is read in the calling thread
+    STREAM_BATCH_SIZE items at a time and each batch is mapped on the pool,
+    so only one batch is held in memory and errors raised by the iterable
+    reach the caller
+
+    Arguments:
+      - func: the function to apply to every item
+      - iterable: the items to process
+    """
+    iterator = iter(iterable)
+    pool = None
+    try:
+        while True:
+            batch = list(islice(iterator, STREAM_BATCH_SIZE))
+            if not batch:
                 break
-    else:
-        ext_root = join('/System', 'Library', 'Extensions')
+            if pool is None:
+                pool = ThreadPool(min(32, cpu_count() * 4, len(batch)))
+            for result in pool.map(func, batch):
+                yield result
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
-        path = join(ext_root,
-                    "%s.kext" % (kext, ),
-                    'Contents', 'MacOS',
-                    kext)
 
-        if isfile(path):
-            return hash_file(path)
+def _hash_path(path):
+    """
+    Returns a (path, hash) tuple for the supplied file
+    """
+    return path, hash_file(path)
 
-        path = join(ext_root,
-                    "Apple%s.kext" % (kext, ),
-                    'Contents', 'MacOS',
-                    "Apple%s" % (kext, ))
 
-        if isfile(path):
-            return hash_file(path)
+def _kext_index(kextfind):
+    """
+    Returns a dictionary mapping kext names (the bundle name without the
+    .kext extension) to the array of paths in kextfind with that name
+    """
+    index = {}
+    for i in kextfind or []:
+        name = basename(i)
+        if name.endswith('.kext'):
+            name = name[:-len('.kext')]
+        index.setdefault(name, []).append(i)
+    return index
 
-        path = join(ext_root, "%s.kext" % (kext, ), kext)
 
-        if isfile(path):
-            return hash_file(path)
+@memoize
+def _kextfind_index():
+    """
+    Returns the kext index of get_kextfind(), built once per process
+    """
+    return _kext_index(get_kextfind())
+
 
-        path = join('/System', 'Library', 'Filesystems', 'AppleShare',
-                     "%s.kext" % (kext, ),
-                     'Contents', 'MacOS',
-                     kext)
+def _index_for(kextfind):
+    """
+    Returns the kext index of a supplied kextfind. The cached index is used
+    when kextfind is the (immutable, memoized) output of get_kextfind(), and
+    an index is built for the call otherwise
+    """
+    if kextfind is get_kextfind():
+        return _kextfind_index()
+    return _kext_index(kextfind)
+
+
+def _find_kext_binary(index, kext):
+    """
+    Returns the path of the binary of a supplied kext, None if it can't be
+    found
 
+    Arguments:
+      - index: the kext index of the output of kextfind, see _kext_index
+      - kext: the name or bundle identifier of the kext
+    """
+    kext = kext.split(".")[-1]
+    for i in index.get(kext, []):
+        path = join(i, "Contents", "MacOS", kext)
+        if isfile(path):
+            return path
+
+    ext_root = join('/System', 'Library', 'Extensions')
+    candidates = [
+        join(ext_root,
+             "%s.kext" % (kext, ),
+             'Contents', 'MacOS',
+             kext),
+        join(ext_root,
+             "Apple%s.kext" % (kext, ),
+             'Contents', 'MacOS',
+             "Apple%s" % (kext, )),
+        join(ext_root, "%s.kext" % (kext, ), kext),
+        join('/System', 'Library', 'Filesystems', 'AppleShare',
+             "%s.kext" % (kext, ),
+             'Contents', 'MacOS',
+             kext),
+    ]
+    for path in candidates:
         if isfile(path):
-            return hash_file(path)
+            return path
+    return None
 
-    if found is None:
-        return found
-    else:
-        return hash_file(found)
+
+def hash_kext(kextfind, kext):
+    """
+    Looks in /System/Library/Extensions/ for a supplied kext and returns it's
+    hash if it exists, None if it doesn't. When kextfind is the output of
+    get_kextfind() it's name index is built once and shared by every call;
+    for any other kextfind, use hash_kexts to look up more than one kext
+    """
+    path = _find_kext_binary(_index_for(kextfind), kext)
+    if path is None:
+        return None
+    return hash_file(path)
+
+
+def hash_kexts(kextfind, kexts):
+    """
+    Returns a dictionary mapping each of the supplied kexts to it's hash, or
+    to None if it can't be found. kextfind is indexed by name once for all of
+    the kexts, and the kext binaries are hashed concurrently. Prefer this to
+    calling hash_kext for each kext
+    """
+    index = _index_for(kextfind)
+    paths = dict((kext, _find_kext_binary(index, kext)) for kext in kexts)
+    hashes = dict(_parallel_map(
+        _hash_path,
+        set(path for path in paths.values() if path is not None)
+    ))
+    return dict((kext, hashes.get(path)) for kext, path in paths.items())
 
 
+@memoize
 def list_home_dirs():
     """
-    Returns an array of all directories in /Users
+    Returns a tuple of all directories in /Users. The result is cached for
+    the lifetime of the process, which is why it's immutable
+    """
+    return tuple(list_dirs_in_dir("/Users/"))
+
+
+@memoize
+def _home_children(home):
+    """
+    Returns the set of names present in a supplied home directory. The
+    listing is cached, so each home directory is only read once per process
+    """
+    try:
+        return frozenset(entry.name for entry in _scandir(home))
+    except OSError:
+        return frozenset()
+
+
+def _has(home, rel):
+    """
+    Returns True if a file exists at a path relative to a home directory.
+    Paths whose first component isn't in the home directory are ruled out
+    without touching the filesystem
+
+    Arguments:
+      - home: the home directory
+      - rel: the path of the file, relative to the home directory
+    """
+    return rel.split('/', 1)[0] in _home_children(home) and \
+        isfile(join(home, rel))
+
+
+@memoize
+def collect_home_artifacts():
+    """
+    Returns a dictionary of the files of interest in every home directory,
+    gathered in a single pass over the home directories and cached for the
+    lifetime of the process. For each key of HOME_ARTIFACT_DIRS the value is
+    the array of files in that directory of every home, and for each key of
+    HOME_ARTIFACT_FILES it's the array of those files that exist
     """
-    return list_dirs_in_dir("/Users/")
+    artifacts = dict(
+        (name, []) for name in chain(HOME_ARTIFACT_DIRS, HOME_ARTIFACT_FILES)
+    )
+    for home in list_home_dirs():
+        children = _home_children(home)
+        for name, rel in HOME_ARTIFACT_DIRS.items():
+            if rel.split('/', 1)[0] in children:
+                artifacts[name] += list_files_in_dir(join(home, rel))
+        for name, rels in HOME_ARTIFACT_FILES.items():
+            artifacts[name] += [join(home, rel) for rel in rels
+                                if _has(home, rel)]
+    return artifacts
 
 
 def get_environment_files():
@@ -200,40 +489,87 @@ def get_environment_files():
     files = [
         ".MacOS/environment",
     ]
-    env = []
-    for i in product(list_home_dirs(), files):
-        env.append("/".join(i))
-    return env
+    return [join(home, rel) for home in list_home_dirs() for rel in files]
 
 
 def list_recentitems():
     """
     Returns an array of all com.apple.recentitems files
     """
-    files = ["Library/Preferences/com.apple.recentitems.plist"]
-    items = []
-    for i in product(list_home_dirs(), files):
-        if isfile("/".join(i)):
-            items.append("/".join(i))
-    return items
+    return list(collect_home_artifacts()["recentitems"])
+
+
+def _match_perms_in_dir(root, perms):
+    """
+    Returns a tuple of an array of root and the files directly in it that
+    have given permissions, and an array of the subdirectories of root
+
+    Arguments:
+      - root: the directory to search
+      - perms: the compiled permissions regex
+    """
+    files = []
+    subdirs = []
+    try:
+        entries = list(_scandir(root))
+    except OSError:
+        # root isn't a readable directory, so like walk() report nothing
+        return files, subdirs
+    try:
+        if perms.match(oct(stat(root)[ST_MODE])[-3:]):
+            files.append(root)
+    except OSError:
+        pass
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False) and perms.match(
+                    oct(entry.stat(follow_symlinks=False)[ST_MODE])[-3:]
+            ):
+                files.append(entry.path)
+        except OSError:
+            # the entry vanished between the directory read and the stat
+            pass
+    return files, subdirs
+
+
+def _walk_with_perms(directory, perms):
+    """
+    Returns an array of all files and directories in a given directory that
+    have given permissions, searched serially in topdown order. Each
+    directory is read once, and it's subdirectories are searched next
+
+    Arguments:
+      - directory: the directory to search
+      - perms: the compiled permissions regex
+    """
+    files = []
+    stack = [directory]
+    while stack:
+        found, subdirs = _match_perms_in_dir(stack.pop(), perms)
+        files += found
+        stack.extend(reversed(subdirs))
+    return files
 
 
 def find_with_perms(directory, perms):
     """
     Returns an array of all files and directories in a given directory
-    that have given permissions
+    that have given permissions. Each top level subdirectory is searched on
+    it's own thread, so that the directory reads and stats of separate trees
+    overlap
 
     Arguments:
       - dir: the directory to search
-      - perms: the permissions to filter by (in regex form)
-    """
-    files = []
-    for [i, _, _] in walk(directory):
-        if match(r"%s" % (perms, ), oct(stat(i)[ST_MODE])[-3:]):
-            files.append(i)
-        for fname in list_files_in_dir(i):
-            if match(r"%s" % (perms, ), oct(stat(i)[ST_MODE])[-3:]):
-                files.append(fname)
+      - perms: the permissions to filter by, as a regex string or as a
+        compiled regex
+    """
+    if not hasattr(perms, 'match'):
+        perms = recompile(perms)
+    files, subdirs = _match_perms_in_dir(directory, perms)
+    for found in _parallel_map(lambda i: _walk_with_perms(i, perms), subdirs):
+        files += found
     return files
 
 
@@ -241,19 +577,10 @@ def list_authorized_keys():
     """
     Returns an array of all authorized_keys files on the filesystem
     """
-    files = [
-        ".ssh/authorized_keys",
-        ".ssh2/authorized_keys",
-    ]
-
-    keys = []
-    for i in product(["/var/root/"], files):
-        if isfile("/".join(i)):
-            keys.append("/".join(i))
-    for i in product(list_home_dirs(), files):
-        if isfile("/".join(i)):
-            keys.append("/".join(i))
-    return keys
+    keys = [join("/var/root", rel)
+            for rel in HOME_ARTIFACT_FILES["authorized_keys"]
+            if _has("/var/root", rel)]
+    return keys + collect_home_artifacts()["authorized_keys"]
 
 
 def list_ssh_keys(no_password=False):
@@ -264,14 +591,7 @@ def list_ssh_keys(no_password=False):
       - no_password: only return keys without a password. defaults to false,
         which returns all keys
     """
-    files = [
-        ".ssh/id_rsa",
-    ]
-
-    ssh_keys = []
-    for i in product(list_home_dirs(), files):
-        if isfile("/".join(i)):
-            ssh_keys.append("/".join(i))
+    ssh_keys = list(collect_home_artifacts()["ssh_keys"])
     if not no_password:
         return ssh_keys
     else:
@@ -288,6 +608,19 @@ def list_ssh_keys(no_password=False):
         return no_passphrase
 
 
+def _has_weak_key(filename):
+    """
+    Returns True if a supplied authorized_keys file contains the public key
+    to a weak private key. The whole file is searched with WEAK_KEY_RE in one
+    pass instead of being split and inspected line by line
+    """
+    try:
+        with open(filename, 'rb') as fname:
+            return WEAK_KEY_RE.search(fname.read()) is not None
+    except IOError:
+        return False
+
+
 def list_weak_keys():
     """
     Returns an array of all authorized_keys file that contain the public keys
@@ -295,24 +628,13 @@ def list_weak_keys():
 
     Currently, this function looks for keys that
     - Are DSA keys (maximum of 1024 bit key length)
-    - Are RSA keys with a hash that has a length of < 300 bytes
-      2048 bit RSA keys have a public key hash size that are in between 315 and
-      319 bytes
+    - Are RSA keys shorter than 2048 bits. The base64 encoded public key of a
+      2048 bit RSA key is 372 characters long, so shorter keys are flagged
+      without having to decode them
     """
-    weak_keys = []
-    for i in list_authorized_keys():
-        try:
-            with open(i) as fname:
-                for line in fname:
-                    alg = line.split(' ')[0]
-                    key = line.split(' ')[1]
-                    if alg == "ssh-rsa" and getsizeof(b64decode(key)) < 300:
-                        weak_keys.append(i)
-                    elif alg == "ssh-dss":
-                        weak_keys.append(i)
-        except IOError:
-            pass
-    return weak_keys
+    keys = list_authorized_keys()
+    return [i for i, weak in zip(keys, _parallel_map(_has_weak_key, keys))
+            if weak]
 
 
 def list_current_host_pref_files():
@@ -320,16 +642,7 @@ def list_current_host_pref_files():
     Return an array of the files that are present in
     ~/Library/Prefernces/ByHost
     """
-    files = []
-    for home_dir in list_home_dirs():
-        try:
-            files += list_files_in_dir(
-                home_dir + "/Library/Preferences/ByHost/"
-            )
-        except OSError:
-            pass
-
-    return files
+    return list(collect_home_artifacts()["prefs_byhost"])
 
 
 def list_launch_agents():
@@ -362,14 +675,7 @@ def list_homedir_launch_agents():
     """
     Return an array of the files that are present in ~/Library/LaunchAgents
     """
-    files = []
-    for home_dir in list_home_dirs():
-        try:
-            files += list_files_in_dir(home_dir + "/Library/LaunchAgents/")
-        except OSError:
-            pass
-
-    return files
+    return list(collect_home_artifacts()["launch_agents"])
 
 
 def list_launch_daemons():
@@ -434,34 +740,42 @@ def is_ssh_key(filename):
     """
     Returns True if a file might be an ssh key, False if not
     """
-    if isfile(filename) and getsizeof(filename) < 10000:
+    try:
+        info = stat(filename)
+    except OSError:
+        return False
+    if not S_ISREG(info.st_mode) or info.st_size >= 10000:
+        return False
+    try:
         with open(filename, 'rb') as key:
-            line1 = next(key)
-            return match("^[-]*BEGIN.*PRIVATE KEY[-]*$", line1) is not None
-    else:
+            line1 = key.readline(256)
+    except IOError:
         return False
+    return PRIVATE_KEY_RE.match(line1) is not None
+
+
+def _classify_ssh_key(filename):
+    """
+    Returns the supplied filename if mdfind's match is an ssh private key,
+    None if it isn't. id_*sa files outside of ~/.ssh are always reported,
+    *.id files are reported if they look like private keys
+    """
+    if fnmatchcase(basename(filename), 'id_*sa'):
+        if not SSH_HOME_RE.match(filename):
+            return filename
+    elif is_ssh_key(filename):
+        return filename
+    return None
 
 
 def find_ssh_keys():
     """
     Returns an array of SSH private keys on the host
     """
-    keys = []
-    keys1 = shell_out("mdfind kMDItemFSName=='id_*sa'")
-    if keys1:
-        for key in keys1:
-            if key and not match("^/Users/[a-zA-Z0-9]*/.ssh", key):
-                keys.append(key)
-
-    keys2 = shell_out("mdfind kMDItemFSName=='*.id'")
-    if keys2:
-        for key in keys2:
-            try:
-                if isfile(key) and is_ssh_key(key):
-                    keys.append(key)
-            except OSError:
-                pass
-            except Exception:
-                pass
-
-    return keys
+    candidates = shell_out_iter([
+        "mdfind",
+        "kMDItemFSName == 'id_*sa' || kMDItemFSName == '*.id'",
+    ])
+    return [key for key in _parallel_map_stream(_classify_ssh_key,
+                                                (i for i in candidates if i))
+            if key is not None]
@@ -12,7 +12,7 @@ def get_ifconfig():
     """
     Returns a JSON array of `ifconfig`
     """
-    ifconfig = shell_out("ifconfig -a")
+    ifconfig = shell_out(["ifconfig", "-a"])
     json = {}
     if ifconfig:
         for i in ifconfig:
@@ -60,10 +60,13 @@ def get_ssid():
     """
     Returns the currently connected SSID
     """
-    command = "".join([
-        "System/Library/PrivateFrameworks/Apple80211.framework/Versions/",
-        "Current/Resources/airport -I",
-    ])
+    command = [
+        "".join([
+            "System/Library/PrivateFrameworks/Apple80211.framework/Versions/",
+            "Current/Resources/airport",
+        ]),
+        "-I",
+    ]
     airport = shell_out(command)
     for i in airport:
         if re.match(r'^SSID:', i.strip()):
@@ -74,7 +77,7 @@ def get_default_gateway_ip():
     """
     Returns the IP address of the currently connected gateway
     """
-    netstat = shell_out("netstat -nr")
+    netstat = shell_out(["netstat", "-nr"])
     for i in netstat:
         if i.startswith("default"):
             return filter(None, i.split(' '))[1]
@@ -85,7 +88,7 @@ def get_default_gateway_mac():
     Returns the MAC address of the currently connected gateway
     """
     ip_addr = get_default_gateway_ip()
-    arp = shell_out("arp -an")
+    arp = shell_out(["arp", "-an"])
     for i in arp:
         if ("(%s)" % ip_addr) in i:
             return i.split(' ')[3]
@@ -109,7 +112,7 @@ def ssh_length():
     Returns an array of times that open ssh connections have been open
     """
     ssh_times = []
-    ps_ax = shell_out("ps -ax -o etime,command -c")
+    ps_ax = shell_out(["ps", "-ax", "-o", "etime,command", "-c"])
     for i in ps_ax:
         data = i.strip().strip('\n').split(' ')
         if len(data) == 2 and data[-1] == 'ssh':
@@ -121,7 +124,7 @@ def scutil_dns():
     """
     Returns a dictinoary with the search domain, nameserver0 and nameserver1
     """
-    scutil_command = shell_out("scutil --dns")
+    scutil_command = shell_out(["scutil", "--dns"])
     scutil = {}
     if scutil_command:
         for i in scutil_command:
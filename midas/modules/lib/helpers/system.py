@@ -4,31 +4,70 @@ This is a set of helper functions for system utilities
 """
 
 from subprocess import Popen, PIPE, call
+from os import devnull
 import plistlib
+import shlex
 from re import IGNORECASE
 from re import compile as recompile
 from os.path import isfile, split
+from mmap import mmap, ACCESS_READ
+from collections import OrderedDict
+
+from utilities import memoize
 
 
 def shell_out(command):
     """
-    Executes a shell command and returns it's output as an array of lines
+    Executes a command and returns it's output as an array of lines. The array
+    is empty if the command didn't output anything
 
     Arguments
-      - command: the full command to be executed
+      - command: the command to be executed as an array of arguments. A string
+        is also accepted, in which case it's split using shell syntax
     """
+    if not isinstance(command, list):
+        command = shlex.split(command)
     return Popen(
-        command.split(' '),
+        command,
         stdout=PIPE,
-        stderr=PIPE
-    ).communicate()[0].strip('\n').split('\n')
+        stderr=PIPE,
+        universal_newlines=True
+    ).communicate()[0].splitlines()
+
+
+def shell_out_iter(command):
+    """
+    Executes a command and yields it's output one line at a time, as the
+    command writes it. Use this instead of shell_out when the output is only
+    scanned once, so that it doesn't have to be held in memory as a whole
+
+    Arguments
+      - command: the command to be executed as an array of arguments. A string
+        is also accepted, in which case it's split using shell syntax
+    """
+    if not isinstance(command, list):
+        command = shlex.split(command)
+    with open(devnull, 'w') as null:
+        proc = Popen(
+            command,
+            stdout=PIPE,
+            stderr=null,
+            bufsize=-1,
+            universal_newlines=True
+        )
+        try:
+            for line in iter(proc.stdout.readline, ''):
+                yield line.rstrip('\n')
+        finally:
+            proc.stdout.close()
+            proc.wait()
 
 
 def get_kextstat():
     """
     Returns a nice JSON array of `kextstat`
     """
-    kextstat = shell_out("kextstat -l")
+    kextstat = shell_out(["kextstat", "-l"])
     header = [
         'Index',
         'Refs',
@@ -39,26 +78,21 @@ def get_kextstat():
         'Version',
         'Linked Against'
     ]
-    kextstat_json = {}
-    for i in range(len(kextstat)):
-        mod = filter(None, kextstat[i].split(" "))
-        mod = mod[:7] + ["-".join(mod[7:])]
-        kextstat[i] = mod
-
-    for i in kextstat:
-        j = dict(zip(header, i))
-        kextstat_json[j["Index"]] = j
-
-    return kextstat_json
+    return {
+        mod[0]: dict(zip(header, mod[:7] + ["-".join(mod[7:])]))
+        for mod in (i.split() for i in kextstat) if mod
+    }
 
 
+@memoize
 def get_kextfind():
     """
-    Returns an array of .kext files
+    Returns a tuple of .kext files, None if there are none. The result is
+    cached for the lifetime of the process, which is why it's immutable
     """
-    kextfind = shell_out("kextfind")
+    kextfind = shell_out(["kextfind"])
     if kextfind:
-        return kextfind
+        return tuple(kextfind)
     else:
         return None
 
@@ -67,39 +101,38 @@ def get_launchctl():
     """
     Returns a nice JSON array of `launchctl list`
     """
-    launchctl = shell_out("/bin/launchctl list")
+    launchctl = shell_out(["/bin/launchctl", "list"])
     header = ["PID", "Status", "Label"]
-    launchctl_json = {}
-
-    launchctl = launchctl[1::]
+    return {
+        i: dict(zip(header, [j for j in line.split("\t") if j]))
+        for i, line in enumerate(launchctl[1:])
+    }
 
-    for i in range(len(launchctl)):
-        mod = filter(None, launchctl[i].split("\t"))
-        launchctl[i] = mod
 
-    for i in range(len(launchctl)):
-        j = dict(zip(header, launchctl[i]))
-        launchctl_json[i] = j
-
-    return launchctl_json
-
-
-def strings(executable):
+def strings(executable, minlen=4):
     """
-    Returns an array of unique strings found in a supplied executable
+    Returns an array of unique strings found in a supplied executable, in
+    the order in which they first appear. Like strings(1), a string is a run
+    of at least minlen printable ASCII or tab characters. The executable is
+    memory mapped and scanned in place rather than being piped through
+    `strings`
     """
-    if isfile(executable):
-        try:
-            strings_list = list(set(shell_out("strings %s" % executable)))
-        except OSError:
-            return []
-        except Exception:
-            return []
-        if strings_list:
-            return strings_list
-        else:
-            return []
-    else:
+    if not isfile(executable):
+        return []
+    printable = recompile(br"[\t\x20-\x7e]{%d,}" % (minlen, ))
+    try:
+        with open(executable, 'rb') as fname:
+            contents = mmap(fname.fileno(), 0, access=ACCESS_READ)
+            try:
+                found = (i.group() for i in printable.finditer(contents))
+                if bytes is not str:
+                    # the matches are ascii bytes, return them as native str
+                    found = (i.decode('ascii') for i in found)
+                return list(OrderedDict.fromkeys(found))
+            finally:
+                contents.close()
+    except (ValueError, EnvironmentError):
+        # empty and unreadable files can't be mapped
         return []
 
 
@@ -110,12 +143,13 @@ def delete_file(filename):
     call(["rm", "-f", filename])
 
 
+@memoize(maxsize=1024)
 def installed(program):
     """
     Returns the path of a supplied program if the supplied program is installed
     and returns False if it is not
     """
-    which = shell_out("mdfind -name %s" % program)
+    which = shell_out(["mdfind", "-name", program])
     if which:
         for i in which:
             _, fname = split(i)
@@ -125,16 +159,17 @@ def installed(program):
         return False
 
 
+@memoize
 def last_user_name():
     """
     Returns the last logged in username from com.apple.loginwindow.plist
     """
-    command = " ".join([
+    command = [
         "defaults",
         "read",
         "/Library/Preferences/com.apple.loginwindow.plist",
         "lastUserName",
-    ])
+    ]
     last_user = shell_out(command)
     if len(last_user) != 1:
         return False
@@ -143,12 +178,13 @@ def last_user_name():
     return last_user
 
 
+@memoize(maxsize=1024)
 def crontab_for_user(user):
     """
     Returns False is a supplied user doesn't have a crontab, and returns the
     crontab (pipes in place of newlines) if the user does have one
     """
-    crontab = filter(None, shell_out("crontab -u %s -l" % user))
+    crontab = filter(None, shell_out(["crontab", "-u", user, "-l"]))
     if crontab:
         return '|'.join(crontab)
     else:
@@ -159,33 +195,27 @@ def last():
     """
     Returns the first two columns of the `last` command
     """
-    last_command = shell_out("last")[:-2]
-    last_output = []
-    for i in last_command:
-        last_output.append(filter(None, i.split(" "))[:2])
-    return last_output
+    return [i.split()[:2] for i in shell_out(["last"])[:-2]]
 
 
 def list_users():
     """
     Returns an array of all 'users' on the system
     """
-    users = []
-    dscacheutil = shell_out("dscacheutil -q user")
-    if dscacheutil:
-        for i in dscacheutil:
-            if i.startswith('name: '):
-                users.append(i[6:])
-    return users
+    return [
+        i[6:] for i in shell_out_iter(["dscacheutil", "-q", "user"])
+        if i.startswith('name: ')
+    ]
 
 
+@memoize(maxsize=1024)
 def run_file(filename):
     """
     Returns file information on a given filename. Returns None if file doesn't
     exist
     """
     if isfile(filename):
-        output = shell_out("file %s" % filename)
+        output = shell_out(["file", filename])
         if output:
             try:
                 output = output[0]
@@ -202,8 +232,7 @@ def lsof():
     """
     Returns a array of lsof -i data
     """
-    lsof_output = shell_out("lsof -i")
-    lsof_data = []
+    lsof_output = shell_out(["lsof", "-i"])
     headers = [
         'command',
         'pid',
@@ -215,19 +244,15 @@ def lsof():
         'node',
         'name',
     ]
-    lsof_output = lsof_output[1:]
-
-    for i in lsof_output:
-        lsof_data.append(dict(zip(headers, filter(None, i.split(" ")))))
-
-    return lsof_data
+    return [dict(zip(headers, i.split())) for i in lsof_output[1:]]
 
 
+@memoize
 def is_fde_enabled():
     """
     Returns True if FDE is enabled, False if it is not
     """
-    fde = shell_out("fdesetup status")
+    fde = shell_out(["fdesetup", "status"])
     if fde == ['FileVault is On.']:
         return True
     return False
@@ -4,6 +4,38 @@ This is a set of helper functions for general utilities
 """
 
 import difflib
+from functools import wraps
+from collections import OrderedDict
+
+
+def memoize(func=None, maxsize=None):
+    """
+    a decorator that caches the return value of a function for each set of
+    arguments for the lifetime of the process. the cache can be emptied with
+    func.cache_clear()
+
+    use @memoize(maxsize=n) to keep at most n results, in which case the
+    oldest result is evicted to make room for a new one
+    """
+    if func is None:
+        return lambda func: memoize(func, maxsize)
+    cache = OrderedDict()
+
+    @wraps(func)
+    def decorated(*args):
+        """
+        internal decorator method
+        """
+        try:
+            return cache[args]
+        except KeyError:
+            ret = func(*args)
+            if maxsize is not None and len(cache) >= maxsize:
+                cache.popitem(last=False)
+            cache[args] = ret
+            return ret
+    decorated.cache_clear = cache.clear
+    return decorated
 
 
 def diff(string1, string2):